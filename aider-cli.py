@@ -3,7 +3,12 @@ import os
 import sys
 import subprocess
 import fnmatch
-from typing import List, Tuple
+import hashlib
+import pickle
+import re
+import shlex
+import tempfile
+from typing import Iterator, List, Optional, Tuple
 
 CACHE_FILES = [
     "*.pyc",
@@ -64,97 +69,247 @@ FILE_TYPES = {
     '8': (None, 'All files')
 }
 
-def get_git_files(file_type: str = None) -> List[str]:
+def _compile_globs(patterns: List[str]) -> 're.Pattern':
+    """Compile glob patterns into a single alternation regex."""
+    if not patterns:
+        return re.compile(r'(?!)')
+    return re.compile('|'.join('(?:' + fnmatch.translate(p.rstrip('/')) + ')' for p in patterns))
+
+_SKIP_RE = _compile_globs(SKIP_FILES)
+_SKIP_DIR_RE = _compile_globs([d for d in SKIP_DIRS if '*' in d])
+_SKIP_DIRS_T = tuple(d for d in SKIP_DIRS if '*' not in d)
+_SKIP_DIR_NAMES = frozenset(d.rstrip('/') for d in _SKIP_DIRS_T)
+
+CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'aider-cli')
+
+_GIT_ROOT = None
+
+def _git_root() -> Optional[str]:
+    """Return the top-level directory of the Git repository, memoized after the first call."""
+    global _GIT_ROOT
+    if _GIT_ROOT is None:
+        try:
+            _GIT_ROOT = subprocess.check_output(['git', 'rev-parse', '--show-toplevel'], text=True).strip()
+        except subprocess.CalledProcessError:
+            _GIT_ROOT = ''
+    return _GIT_ROOT or None
+
+def _should_keep(file: str) -> bool:
+    """Return False for files and directories matching SKIP_FILES or SKIP_DIRS."""
+    if file.endswith('/'):
+        dirname = os.path.basename(file.rstrip('/'))
+        if file.startswith(_SKIP_DIRS_T) or dirname in _SKIP_DIR_NAMES:
+            return False
+        return not _SKIP_DIR_RE.match(dirname)
+
+    basename = file.rpartition('/')[2]
+    if basename[:1] == '.':
+        return False
+
+    return not _SKIP_RE.match(basename)
+
+def _file_list_cache_path(file_type: Optional[str]) -> Optional[str]:
+    """
+    Return the cache file for the tracked-file listing at the current index state.
+
+    The key covers HEAD, the index mtime and size, the working directory,
+    the file type and the skip lists. File names start with a hash of the
+    working directory and file type so stale entries for them can be pruned.
+
+    Returns:
+        Path of the pickle file, or None if the repository state is unknown.
+    """
+    try:
+        index_path, head = subprocess.check_output(
+            ['git', 'rev-parse', '--git-path', 'index', 'HEAD'],
+            text=True, stderr=subprocess.DEVNULL
+        ).splitlines()
+        index_stat = os.stat(index_path)
+    except (subprocess.CalledProcessError, ValueError, OSError):
+        return None
+
+    cwd = os.getcwd()
+    key = repr((cwd, head, index_stat.st_mtime_ns, index_stat.st_size,
+                file_type, SKIP_FILES, SKIP_DIRS))
+    listing_hash = hashlib.sha1(repr((cwd, file_type)).encode()).hexdigest()[:16]
+    return os.path.join(CACHE_DIR, f"{listing_hash}-{hashlib.sha1(key.encode()).hexdigest()}.pkl")
+
+def _store_file_list(cache_path: str, files: List[str]) -> None:
+    """Write the file list to cache_path and remove older entries for the same listing."""
+    listing_prefix = os.path.basename(cache_path).partition('-')[0] + '-'
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with os.scandir(CACHE_DIR) as entries:
+            for entry in entries:
+                if entry.name.startswith(listing_prefix) and entry.path != cache_path:
+                    os.unlink(entry.path)
+        with open(cache_path, 'wb') as f:
+            pickle.dump(files, f, protocol=pickle.HIGHEST_PROTOCOL)
+    except OSError:
+        pass
+
+def _iter_nul_separated(stream) -> Iterator[str]:
+    """Yield the NUL-terminated entries of a binary stream as decoded paths."""
+    pending = b''
+    for chunk in iter(lambda: stream.read(65536), b''):
+        entries = (pending + chunk).split(b'\0')
+        pending = entries.pop()
+        for entry in entries:
+            yield os.fsdecode(entry)
+    if pending:
+        yield os.fsdecode(pending)
+
+def get_git_files(file_type: str = None, tracked_only: bool = False) -> Tuple[List[str], List[str]]:
     """
     Retrieve files from the Git repository.
 
+    Output of git is streamed and filtered against SKIP_FILES and SKIP_DIRS
+    as it is read, so rejected entries never enter the result. Tracked-only
+    listings depend on nothing but the index, so they are cached under
+    CACHE_DIR and reused while HEAD and the index are unchanged.
+
     Args:
         file_type (str, optional): File extension to filter by.
                                    If None, retrieves all files.
+        tracked_only (bool, optional): List only files in the index. This skips
+                                       git's untracked-file and .gitignore walk,
+                                       at the cost of hiding new files until
+                                       they are added.
 
     Returns:
-        A sorted list of files and top-level directories.
+        An unsorted list of kept files and top-level directories, with
+        ordering left to sort_files, and the directory entries git collapsed
+        because nothing below them is tracked.
     """
+    # Untracked files are not reflected in the index, so only cache tracked listings
+    cache_path = _file_list_cache_path(file_type) if tracked_only else None
+    if cache_path:
+        try:
+            # Tracked listings never contain collapsed directories
+            with open(cache_path, 'rb') as f:
+                return pickle.load(f), []
+        except (OSError, pickle.PickleError, EOFError):
+            pass
+
     try:
-        cmd = ['git', 'ls-files', '--cached', '--others', '--exclude-standard']
+        if tracked_only:
+            cmd = ['git', 'ls-files', '-z', '--cached']
+        else:
+            # --directory collapses wholly untracked trees into a single 'dir/' entry.
+            # git only does this without a pathspec, so a file-type listing still
+            # shows untracked files one by one; expand_selection and the reload
+            # binding expand collapsed entries. --no-empty-directory keeps out empty
+            # directories and ones holding only ignored files.
+            cmd = ['git', 'ls-files', '-z', '--cached', '--others', '--exclude-standard',
+                   '--directory', '--no-empty-directory', '--deduplicate']
 
         if file_type:
             cmd.append(f'*.{file_type}')
 
-        files = subprocess.check_output(cmd, text=True).splitlines()
-
         top_dirs = set()
-        for file in files:
-            parts = file.split('/')
-            if len(parts) > 1:
-                top_dirs.add(f"{parts[0]}/")
-
-        all_entries = sorted(list(top_dirs) + files, key=lambda x: (not x.endswith('/'), x.lower()))
-
-        return all_entries
+        files = []
+        collapsed = []
+        with subprocess.Popen(cmd, stdout=subprocess.PIPE) as proc:
+            for file in _iter_nul_separated(proc.stdout):
+                head, sep, _ = file.partition('/')
+                if sep:
+                    top_dirs.add(sys.intern(head + '/'))
+                if _should_keep(file):
+                    files.append(file)
+                    if file.endswith('/'):
+                        collapsed.append(file)
+        if proc.returncode:
+            raise subprocess.CalledProcessError(proc.returncode, cmd)
+
+        files.extend(d for d in top_dirs.difference(files) if _should_keep(d))
     except subprocess.CalledProcessError as e:
         print(f"Error retrieving Git files: {e}", file=sys.stderr)
         sys.exit(1)
 
-def filter_files(files: List[str], skip_patterns: List[str], skip_dirs: List[str]) -> List[str]:
-    """Filter out files matching skip patterns."""
-    def should_keep(file: str) -> bool:
-        if file.endswith('/'):
-            for dir in skip_dirs:
-                if file.startswith(dir):
-                    return False
-            return True
-
-        if os.path.basename(file).startswith('.'):
-            return False
+    if cache_path:
+        _store_file_list(cache_path, files)
+    return files, collapsed
 
-        for pattern in skip_patterns:
-            if fnmatch.fnmatch(os.path.basename(file), pattern):
-                return False
-
-        return True
-
-    return [f for f in files if should_keep(f)]
-
-def build_reload_command(is_back: bool = False) -> str:
+def build_reload_command(is_back: bool = False, tracked_only: bool = False) -> str:
     """Build the reload command for fzf ctrl+l binding."""
-    dir_excludes = ' '.join(f"-not -path '*/{d}'" for d in CACHE_DIRS)
-    file_excludes = ' '.join(f"-not -path '*/{f}'" for f in [f.replace('*', '**/') for f in CACHE_FILES])
-    
-    cmd = r'''cd {} && find . -maxdepth 1 \( -type d -o -type f \) {} {} -printf '%y %p\n' | sed 's|^d \.|0 {}|;s|^f \.|1 {}|' | sort | cut -d' ' -f2-'''
+    if tracked_only:
+        ls_files = 'ls-files --cached'
+    else:
+        ls_files = 'ls-files --cached --others --exclude-standard'
+    # Keep only the entries one level below d, tagging directories so they sort first
+    awk_script = r"""'d == "" || index($0, d) == 1 { rest = substr($0, length(d) + 1); i = index(rest, "/"); if (i) print "0 " d substr(rest, 1, i); else if (rest != "") print "1 " $0 }'"""
+    sort_cmd = "sort -u | cut -d' ' -f2-"
     if is_back:
-        return r'''root=$(git rev-parse --show-toplevel 2>/dev/null || pwd) && cd "$root" && find . -maxdepth 1 \( -type d -o -type f \) ''' + dir_excludes + ' ' + file_excludes + r''' -printf '%y %p\n' | sed "s|^d \.|0 $(basename $(pwd))|;s|^f \.|1 $(basename $(pwd))|" | sort | cut -d' ' -f2-'''
-    return cmd.format('{}', dir_excludes, file_excludes, '{}', '{}')
+        return f'git -C "$(git rev-parse --show-toplevel)" {ls_files} | awk -v d= {awk_script} | {sort_cmd}'
+    return f'git {ls_files} -- {{}} | awk -v d={{}} {awk_script} | {sort_cmd}'
 
-def interactive_file_selection(files: List[str]) -> List[str]:
-    """Use fzf for interactive file selection with hierarchical directory support."""
+def _python_files(root: str, prefix: str = '') -> Iterator[Tuple[str, str]]:
+    """Yield (path, relative path) for non-hidden Python files below root."""
     try:
-        # Get initial directory from first file or use current directory
-        current_dir = os.path.abspath(os.path.dirname(files[0]) if files else '.')
-        # Get git root or use initial directory as the limit
-        try:
-            git_root = subprocess.check_output(['git', 'rev-parse', '--show-toplevel'], text=True).strip()
-        except subprocess.CalledProcessError:
-            git_root = current_dir
+        with os.scandir(root) as it:
+            entries = list(it)
+    except OSError:
+        # Skip unreadable directories, as the find loop used to
+        return
+    for entry in entries:
+        if entry.name.startswith('.'):
+            continue
+        if entry.is_dir(follow_symlinks=False):
+            if entry.name != '__pycache__':
+                yield from _python_files(entry.path, f"{prefix}{entry.name}/")
+        elif entry.name.endswith('.py') and entry.is_file(follow_symlinks=False):
+            yield entry.path, f"{prefix}{entry.name}"
+
+def _preview_path(path: str) -> None:
+    """Print the fzf preview for a file or directory."""
+    if os.path.isdir(path):
+        print(f"Directory: {path}")
+        print("Python files:")
+        for file_path, rel_path in sorted(_python_files(path), key=lambda x: x[1]):
+            print(f"  {rel_path}")
+            try:
+                with open(file_path, 'rb') as f:
+                    first_line = f.readline()
+            except OSError:
+                continue
+            if first_line.startswith(b'#!'):
+                print(f"    {first_line.decode(errors='replace').rstrip()}")
+        return
+
+    print(f"File: {path}", flush=True)
+    try:
+        if subprocess.run(['bat', '--style=numbers', '--color=always', path],
+                          stderr=subprocess.DEVNULL).returncode == 0:
+            return
+    except FileNotFoundError:
+        pass
+    try:
+        with open(path, 'rb') as f:
+            sys.stdout.buffer.write(f.read())
+    except OSError as e:
+        print(f"Error reading {path}: {e}", file=sys.stderr)
+
+def interactive_file_selection(files: List[str], tracked_only: bool = False) -> List[str]:
+    """
+    Use fzf for interactive file selection with hierarchical directory support.
+
+    Args:
+        files (List[str]): Entries to offer in fzf.
+        tracked_only (bool, optional): Keep directory reloads to files in the index.
 
+    Returns:
+        The selected entries as listed; directories keep their trailing '/'
+        and are expanded by the caller.
+    """
+    try:
         fzf_input = '\n'.join(files)
 
-        preview_cmd = '''
-            if [ -d {} ]; then
-                echo "Directory: {}";
-                echo "Python files:";
-                cd {} && find . -type f -name "*.py" -not -path "*/.*" -not -path "*/__pycache__/*" | sed 's|^./||' | sort | while read -r file; do
-                    echo "  $file";
-                    first_line=$(head -n 1 "$file" 2>/dev/null);
-                    if [[ "$first_line" == "#!"* ]]; then
-                        echo "    $first_line";
-                    fi
-                done;
-            else
-                echo "File: {}";
-                bat --style=numbers --color=always {} 2>/dev/null || cat {};
-            fi
-        '''
+        # Reload the top-level list from a file instead of inlining it into the binding
+        with tempfile.NamedTemporaryFile('w', prefix='aider-cli.', delete=False) as tf:
+            tf.write(fzf_input)
+        back_cmd = f'cat {shlex.quote(tf.name)}'
+
+        preview_cmd = f'{shlex.quote(sys.executable)} {shlex.quote(os.path.abspath(sys.argv[0]))} --preview {{}}'
 
         fzf_command = [
             'fzf',
@@ -162,40 +317,28 @@ def interactive_file_selection(files: List[str]) -> List[str]:
             '--preview', preview_cmd,
             '--preview-window', 'right:60%',
             '--bind', 'ctrl-p:toggle-preview',
-            '--bind', f'ctrl-l:reload({build_reload_command()})',
-            '--bind', f'ctrl-k:reload(echo "{fzf_input}")',
-            '--bind', f'right:reload({build_reload_command()})',
-            '--bind', f'left:reload(echo "{fzf_input}")',
+            '--bind', f'ctrl-l:reload({build_reload_command(tracked_only=tracked_only)})',
+            '--bind', f'ctrl-k:reload({back_cmd})',
+            '--bind', f'right:reload({build_reload_command(tracked_only=tracked_only)})',
+            '--bind', f'left:reload({back_cmd})',
             '--header', 'Select files and directories (TAB to multi-select, →/CTRL+L to expand, ←/CTRL+K to go back)',
             '--layout', 'reverse',
             '--height', '80%',
             '--ansi'
         ]
 
-        result = subprocess.run(
-            fzf_command,
-            input=fzf_input.encode(),
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
-        )
+        try:
+            result = subprocess.run(
+                fzf_command,
+                input=fzf_input,
+                capture_output=True,
+                text=True
+            )
+        finally:
+            os.unlink(tf.name)
 
         if result.returncode == 0:
-            selected = result.stdout.decode().strip().split('\n')
-            final_files = []
-            for item in selected:
-                if os.path.isdir(item):
-                    # If directory is selected, add all Python files in it recursively
-                    for root, _, filenames in os.walk(item):
-                        for filename in filenames:
-                            if filename.endswith('.py'):
-                                abs_path = os.path.join(root, filename)
-                                rel_path = os.path.relpath(abs_path, git_root)
-                                final_files.append(rel_path)
-                else:
-                    # If file is selected, add it with relative path
-                    rel_path = os.path.relpath(item, git_root)
-                    final_files.append(rel_path)
-            return sorted(set(final_files))  # Remove duplicates
+            return result.stdout.splitlines()
         return []
     except Exception as e:
         print(f"Error running fzf: {e}", file=sys.stderr)
@@ -212,55 +355,113 @@ def sort_files(files: List[str]) -> List[str]:
         List[str]: Sorted list of files and directories.
     """
     def file_key(file: str) -> Tuple[int, bool, str, str]:
-        parts = file.split('/')
-        is_dir = file.endswith('/')
-
+        head, _, tail = file.rpartition('/')
         return (
-            len(parts),
-            not is_dir,
-            ''.join(p + '/' for p in parts[:-1]),
-            parts[-1].lower()
+            file.count('/') + 1,
+            not file.endswith('/'),
+            head.lower(),
+            tail.lower()
         )
 
     return sorted(files, key=file_key)
 
-def expand_directory(directory: str) -> List[str]:
-    """Expand a directory to all files within it."""
+def expand_directories(directories: List[str], file_type: str = None) -> List[str]:
+    """
+    Expand untracked directories to the files within them using a single git call.
+
+    Args:
+        directories (List[str]): Directories collapsed by git ls-files --directory.
+        file_type (str, optional): File extension to filter by.
+
+    Returns:
+        List[str]: Untracked files below the directories that pass the skip filters.
+    """
+    if not directories:
+        return []
+    if file_type:
+        pathspecs = [f'{d}*.{file_type}' for d in directories]
+    else:
+        pathspecs = directories
     try:
-        cmd = ['git', 'ls-files', '--cached', '--others', '--exclude-standard', f'{directory}*']
-        return subprocess.check_output(cmd, text=True).splitlines()
+        cmd = ['git', 'ls-files', '-z', '--others', '--exclude-standard', '--'] + pathspecs
+        files = [os.fsdecode(f) for f in subprocess.check_output(cmd).split(b'\0') if f]
     except subprocess.CalledProcessError:
-        print(f"Error finding files in {directory}", file=sys.stderr)
+        print(f"Error finding files in {', '.join(directories)}", file=sys.stderr)
         return []
 
-def main():
-    print("Select file type to list:")
-    for key, (ext, description) in FILE_TYPES.items():
-        print(f"{key}. {description}")
+    return [f for f in files if _should_keep(f)]
+
+def expand_selection(selected: List[str], files: List[str], collapsed: List[str],
+                     file_type: str = None) -> List[str]:
+    """
+    Resolve fzf selections to files, expanding selected directories.
+
+    Files already listed are taken from memory. Directory entries that git
+    collapsed because nothing below them is tracked are expanded with one
+    call to expand_directories.
 
-    while True:
-        choice = input("Enter your choice (1-8): ").strip()
-        if choice in FILE_TYPES:
-            break
-        print("Invalid choice. Please try again.")
+    Args:
+        selected (List[str]): Entries returned by interactive_file_selection.
+        files (List[str]): Entries that were offered to fzf.
+        collapsed (List[str]): Directory entries collapsed by get_git_files.
+        file_type (str, optional): File extension the listing was filtered by.
+
+    Returns:
+        List[str]: Selected files, possibly with duplicates.
+    """
+    listed = [f for f in files if not f.endswith('/')]
+
+    final_files = []
+    collapsed_dirs = []
+    for item in selected:
+        if not item.endswith('/'):
+            final_files.append(item)
+            continue
+        final_files.extend(f for f in listed if f.startswith(item))
+        if any(item.startswith(d) for d in collapsed):
+            collapsed_dirs.append(item)
+        else:
+            collapsed_dirs.extend(d for d in collapsed if d.startswith(item))
+
+    final_files.extend(expand_directories(collapsed_dirs, file_type))
+    return final_files
+
+def main():
+    if len(sys.argv) > 2 and sys.argv[1] == '--preview':
+        _preview_path(sys.argv[2])
+        return
+
+    tracked_only = '--tracked' in sys.argv[1:]
+    auto_confirm = '--yes' in sys.argv[1:]
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+
+    if args and args[0] in FILE_TYPES:
+        choice = args[0]
+    else:
+        print("Select file type to list:")
+        for key, (ext, description) in FILE_TYPES.items():
+            print(f"{key}. {description}")
+
+        while True:
+            choice = input("Enter your choice (1-8): ").strip()
+            if choice in FILE_TYPES:
+                break
+            print("Invalid choice. Please try again.")
 
     selected_type, description = FILE_TYPES[choice]
     print(f"Listing {description}")
 
-    all_files = get_git_files(selected_type)
+    all_files, collapsed = get_git_files(selected_type, tracked_only)
 
-    filtered_files = filter_files(all_files, SKIP_FILES, SKIP_DIRS)
+    sorted_files = sort_files(all_files)
 
-    sorted_files = sort_files(filtered_files)
+    selected_files = interactive_file_selection(sorted_files, tracked_only)
 
-    selected_files = interactive_file_selection(sorted_files)
+    selected = expand_selection(selected_files, sorted_files, collapsed, selected_type)
 
-    final_files = []
-    for file in selected_files:
-        if file.endswith('/'):
-            final_files.extend(expand_directory(file))
-        else:
-            final_files.append(file)
+    # Get git root or use the current directory as the limit
+    git_root = _git_root() or os.getcwd()
+    final_files = sorted({os.path.relpath(f, git_root) for f in selected})
 
     if not final_files:
         print("No files selected. Exiting.")
@@ -274,9 +475,14 @@ def main():
     print("Generated Aider command:")
     print(' '.join(aider_command))
 
-    execute = input("Do you want to execute this command? (yes/no): ").lower()
+    if auto_confirm:
+        execute = 'yes'
+    else:
+        execute = input("Do you want to execute this command? (yes/no): ").lower()
     if execute == 'yes':
-        subprocess.run(aider_command)
+        # Replace this process with aider rather than waiting on a child
+        sys.stdout.flush()
+        os.execvp(aider_command[0], aider_command)
 
 if __name__ == '__main__':
     main()